@@ -31,6 +31,11 @@ class Config:
     AUDIO_INPUT_DEVICE: Optional[str] = None
     AUDIO_OUTPUT_DEVICE: Optional[str] = None
     
+    # On-device speech recognition (faster-whisper)
+    SPEECH_MODEL: str = "base"
+    SPEECH_LANGUAGE: str = "nl"
+    SPEECH_CLOUD_FALLBACK: bool = False  # Also try Google/Sphinx when local recognition fails
+    
     # Camera settings
     CAMERA_ENABLED: bool = True
     CAMERA_WIDTH: int = 640
@@ -40,6 +45,12 @@ class Config:
     FORCE_USB_CAMERA: bool = False  # Set to True to force USB camera over Pi Camera
     USE_AI_HAT_CAMERA: bool = True  # Set to True to enable AI HAT+ (IMX500) camera
     CAMERA_AWB_MODE: int = 3  # Auto White Balance: 0=auto, 1=tungsten, 2=fluorescent, 3=indoor, 4=daylight, 5=cloudy
+    CAMERA_YUV_CAPTURE: bool = True  # Capture Pi Camera frames as YUV420 (half the memory traffic of RGB888)
+    IMX500_FACE_MODEL: str = ""  # .rpk face network run on the IMX500 sensor itself (AI Camera); empty = CPU detection
+    IMX500_FACE_THRESHOLD: float = 0.5  # Minimum score for IMX500 face detections
+    CAMERA_SHM_NAME: str = ""  # Mirror the latest frame into this shared memory block for other processes (empty = off)
+    CAMERA_DETECT_THREADS: int = 0  # OpenCV worker threads for detection (0 = one per CPU core)
+    FACE_DETECTION_MODEL: str = "./data/face_detection_yunet_2023mar.onnx"  # YuNet ONNX (a *_int8.onnx sibling is preferred); LBP/Haar cascade is used if missing
     
     # Display settings
     FULLSCREEN: bool = True
@@ -12,7 +12,7 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 import uvicorn
 
 from config import config
@@ -26,15 +26,20 @@ from services.voice_command_router import create_voice_command_router, VoiceComm
 from services.voice_recognition_service import create_voice_service
 from services.tts_service import create_tts_service
 
+# Decode worker processes (forkserver) re-import this file as __mp_main__;
+# only the server process sets up logging and builds the assistant
+IS_WORKER_PROCESS = __name__ == "__mp_main__"
+
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO if config.DEBUG else logging.WARNING,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'{config.LOGS_DIR}/assistant.log'),
-        logging.StreamHandler()
-    ]
-)
+if not IS_WORKER_PROCESS:
+    logging.basicConfig(
+        level=logging.INFO if config.DEBUG else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(f'{config.LOGS_DIR}/assistant.log'),
+            logging.StreamHandler()
+        ]
+    )
 
 logger = logging.getLogger(__name__)
 
@@ -243,6 +248,15 @@ class PiAssistant:
                 logger.error(f"Camera error: {e}")
                 return {"frame": None, "success": False, "error": str(e)}
         
+        @self.app.get("/api/camera/frame.jpg")
+        async def get_camera_frame_jpeg():
+            """Get current camera frame as a binary JPEG"""
+            frame = await self.camera_manager.get_frame(format='jpeg')
+            if not frame:
+                return Response(status_code=204)
+            return Response(content=frame, media_type="image/jpeg",
+                            headers={"Cache-Control": "no-store"})
+        
         @self.app.get("/api/camera/status")
         async def get_camera_status():
             """Get camera status"""
@@ -566,7 +580,10 @@ class PiAssistant:
         # Initialize voice command services
         try:
             logger.info("Initializing voice services...")
-            self.voice_recognition = await create_voice_service()
+            # Same Whisper size as AudioManager so both share one cached model
+            self.voice_recognition = await create_voice_service(
+                faster_whisper_model=config.SPEECH_MODEL
+            )
             self.tts_service = await create_tts_service()
             self.voice_router = await create_voice_command_router(self.ai_service, self.mcp_server)
             logger.info("Voice command services initialized")
@@ -591,13 +608,12 @@ class PiAssistant:
         await self.audio_manager.cleanup()
         await self.camera_manager.cleanup()
         
-        # Cleanup voice command services (no cleanup needed for these services)
+        # Cleanup voice command services
+        if self.voice_recognition:
+            await self.voice_recognition.aclose()
         
         logger.info("Pi Assistant cleanup complete")
 
-# Global instance
-assistant = PiAssistant()
-
 async def startup():
     """Application startup"""
     await assistant.initialize()
@@ -606,9 +622,13 @@ async def shutdown():
     """Application shutdown"""
     await assistant.cleanup()
 
-# Add event handlers
-assistant.app.add_event_handler("startup", startup)
-assistant.app.add_event_handler("shutdown", shutdown)
+# Global instance
+if not IS_WORKER_PROCESS:
+    assistant = PiAssistant()
+    
+    # Add event handlers
+    assistant.app.add_event_handler("startup", startup)
+    assistant.app.add_event_handler("shutdown", shutdown)
 
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
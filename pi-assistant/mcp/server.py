@@ -8,6 +8,8 @@ import json
 import logging
 import subprocess
 import os
+import re
+import shutil
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
@@ -26,6 +28,9 @@ class MCPServer:
     
     def __init__(self):
         self.tools: Dict[str, MCPTool] = {}
+        # Resolve the still-capture binary once: rpicam-still on newer Raspberry Pi OS
+        # (replaces libcamera-still), libcamera-still on older systems
+        self._still_command = shutil.which("rpicam-still") or shutil.which("libcamera-still")
         self._register_tools()
     
     def _register_tools(self):
@@ -205,21 +210,12 @@ class MCPServer:
     async def _get_system_info(self, args: Dict[str, Any]) -> Dict[str, Any]:
         """Get system information"""
         try:
-            # CPU usage
-            cpu_cmd = "top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | cut -d'%' -f1"
-            cpu_result = await self._run_command(cpu_cmd)
-            
-            # Memory usage
-            mem_cmd = "free -m"
-            mem_result = await self._run_command(mem_cmd)
-            
-            # Disk usage
-            disk_cmd = "df -h /"
-            disk_result = await self._run_command(disk_cmd)
-            
-            # Temperature (Raspberry Pi specific)
-            temp_cmd = "vcgencmd measure_temp"
-            temp_result = await self._run_command(temp_cmd)
+            cpu_result, mem_result, disk_result, temp_result = await self._run_commands([
+                "top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | cut -d'%' -f1",  # CPU usage
+                "free -m",  # Memory usage
+                "df -h /",  # Disk usage
+                "vcgencmd measure_temp"  # Temperature (Raspberry Pi specific)
+            ])
             
             return {
                 "cpu_usage": cpu_result.strip(),
@@ -295,8 +291,8 @@ class MCPServer:
                 cmd1 = f"raspi-gpio set {pin} op"
                 cmd2 = f"raspi-gpio set {pin} {level}"
                 
-                await self._run_command(cmd1)
-                result = await self._run_command(cmd2)
+                await self._run_command(cmd1, quiet=True)
+                await self._run_command(cmd2, quiet=True)
                 
                 return {"pin": pin, "value": value, "result": "success"}
         
@@ -310,17 +306,12 @@ class MCPServer:
             width = args.get("width", 640)
             height = args.get("height", 480)
             
-            # Use rpicam-still for newer Raspberry Pi OS (replaces libcamera-still)
-            # Try rpicam-still first, fallback to libcamera-still for older systems
-            import shutil
-            if shutil.which("rpicam-still"):
-                cmd = f"rpicam-still -o {filename} --width {width} --height {height} --timeout 2000"
-            elif shutil.which("libcamera-still"):
-                cmd = f"libcamera-still -o {filename} --width {width} --height {height} --timeout 2000"
-            else:
+            if not self._still_command:
                 return {"error": "No camera command found (rpicam-still or libcamera-still)"}
+            # No preview window; a 1s run still lets AE/AWB settle before the still
+            cmd = f"{self._still_command} -n -o {filename} --width {width} --height {height} --timeout 1000"
             
-            result = await self._run_command(cmd)
+            await self._run_command(cmd, quiet=True)
             
             return {"filename": filename, "result": "success"}
         
@@ -338,7 +329,7 @@ class MCPServer:
             
             # Use aplay for audio playback
             cmd = f"aplay {file_path}"
-            result = await self._run_command(cmd)
+            await self._run_command(cmd, quiet=True)
             
             return {"file": file_path, "result": "success"}
         
@@ -348,13 +339,12 @@ class MCPServer:
     async def _network_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
         """Get network status"""
         try:
-            # Get IP addresses
-            ip_cmd = "ip addr show"
-            ip_result = await self._run_command(ip_cmd)
-            
-            # Test connectivity
-            ping_cmd = "ping -c 1 8.8.8.8"
-            ping_result = await self._run_command(ping_cmd)
+            # IP addresses and a connectivity test
+            # ping exits nonzero when offline; that's the answer, not an error
+            ip_result, ping_result = await self._run_commands([
+                "ip addr show",
+                "ping -c 1 8.8.8.8"
+            ], allow_failure=["ping -c 1 8.8.8.8"])
             
             return {
                 "interfaces": ip_result.strip(),
@@ -378,12 +368,31 @@ class MCPServer:
         except Exception as e:
             return {"error": str(e)}
     
-    async def _run_command(self, command: str) -> str:
-        """Run shell command asynchronously"""
+    async def _run_commands(self, commands: List[str], allow_failure: Optional[List[str]] = None) -> List[str]:
+        """Run independent shell commands in one shell, returning each one's output
+        
+        Raises if any command exits nonzero, unless it is listed in allow_failure.
+        """
+        # One fork/exec for the whole batch; after each command a sentinel line
+        # carries its exit status, since the shell only reports the last one
+        sentinel = "---mcp-output-separator---"
+        script = "".join(f'{command}\necho "{sentinel} $?"\n' for command in commands)
+        parts = re.split(f"{sentinel} (\\d+)\n", await self._run_command(script))
+        
+        outputs = []
+        for command, output, status in zip(commands, parts[0::2], parts[1::2]):
+            if status != "0" and command not in (allow_failure or []):
+                raise Exception(f"Command failed with status {status}: {command}")
+            outputs.append(output)
+        return outputs + [""] * (len(commands) - len(outputs))
+    
+    async def _run_command(self, command: str, quiet: bool = False) -> str:
+        """Run shell command asynchronously (quiet: discard stdout, return "")"""
         try:
+            # stderr is always captured for the failure message
             process = await asyncio.create_subprocess_shell(
                 command,
-                stdout=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL if quiet else asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
             
@@ -394,7 +403,7 @@ class MCPServer:
                 if error_msg:
                     raise Exception(f"Command failed: {error_msg}")
             
-            return stdout.decode()
+            return stdout.decode() if stdout is not None else ""
         
         except Exception as e:
             logger.error(f"Command execution error: {e}")
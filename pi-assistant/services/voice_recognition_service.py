@@ -4,17 +4,30 @@ Supports multiple backends: Whisper, Vosk, Google, Web Speech API
 """
 
 import asyncio
+import hashlib
 import logging
 import io
+import os
 import wave
-import json
-from typing import Optional, List, Dict, Any, Callable
+import struct
+import threading
+import multiprocessing
+from collections import deque, OrderedDict
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from abc import ABC, abstractmethod
 from pathlib import Path
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# orjson parses Vosk's result JSON several times faster than the stdlib
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 # Try to import various speech recognition libraries
 try:
     import speech_recognition as sr
@@ -30,6 +43,19 @@ except ImportError:
     VOSK_AVAILABLE = False
     logger.warning("vosk not installed: pip install vosk")
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+    logger.warning("faster-whisper not installed: pip install faster-whisper")
+
 try:
     import openai
     OPENAI_AVAILABLE = True
@@ -43,6 +69,84 @@ try:
 except ImportError:
     AIOHTTP_AVAILABLE = False
 
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+
+# Shared HTTP session for network-bound backends, bound by the service
+_session_var: "ContextVar[Optional[aiohttp.ClientSession]]" = ContextVar("http_session", default=None)
+
+# Canonical 44-byte PCM WAV header: RIFF chunk, 16-byte fmt chunk, data chunk
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+
+def _parse_wav(data: bytes) -> Tuple[int, memoryview]:
+    """
+    Extract sample rate and PCM payload from WAV bytes
+
+    Fast path for the standard 44-byte header; anything else (extra chunks,
+    extended fmt) goes through the wave module. The payload is a zero-copy
+    memoryview: Vosk's cffi binding rejects memoryview/bytearray, so take
+    bytes() of it (or of each slice) before calling AcceptWaveform.
+    """
+    if len(data) >= _WAV_HEADER.size:
+        (riff, _, wave_id, fmt_id, fmt_size, _, _, sample_rate,
+         _, _, _, data_id, data_len) = _WAV_HEADER.unpack_from(data, 0)
+        if (riff == b"RIFF" and wave_id == b"WAVE" and fmt_id == b"fmt "
+                and fmt_size == 16 and data_id == b"data"):
+            data_start = _WAV_HEADER.size
+            return sample_rate, memoryview(data)[data_start:data_start + data_len]
+
+    with wave.open(io.BytesIO(data), 'rb') as wf:
+        return wf.getframerate(), memoryview(wf.readframes(wf.getnframes()))
+
+
+def _pcm16_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Prepend a canonical 44-byte WAV header to mono PCM16 audio"""
+    header = _WAV_HEADER.pack(
+        b"RIFF", 36 + len(pcm), b"WAVE", b"fmt ", 16,
+        1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", len(pcm)
+    )
+    return header + pcm
+
+
+# Loaded ASR models keyed by (backend, model name), shared across service
+# instances so re-initializing the service doesn't pay the load again
+_MODEL_CACHE: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+_MODEL_CACHE_SIZE = 4
+_model_cache_lock = threading.Lock()
+
+
+def load_cached_model(backend: str, name: str, loader: Callable[[], Any]) -> Any:
+    """Return a cached model, loading it with ``loader`` on a miss"""
+    key = (backend, name)
+    with _model_cache_lock:
+        model = _MODEL_CACHE.get(key)
+        if model is not None:
+            _MODEL_CACHE.move_to_end(key)
+            return model
+    
+    model = loader()
+    
+    with _model_cache_lock:
+        _MODEL_CACHE[key] = model
+        _MODEL_CACHE.move_to_end(key)
+        while len(_MODEL_CACHE) > _MODEL_CACHE_SIZE:
+            _MODEL_CACHE.popitem(last=False)
+    return model
+
+
+def pcm16_to_float32(pcm) -> "np.ndarray":
+    """Convert PCM16 samples to float32 in [-1, 1) in one vectorized pass"""
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    out = np.empty(samples.shape, dtype=np.float32)
+    np.multiply(samples, 1.0 / 32768.0, out=out, dtype=np.float32)
+    return out
+
 
 class VoiceRecognitionBackend(ABC):
     """Abstract base class for voice recognition backends"""
@@ -56,11 +160,17 @@ class VoiceRecognitionBackend(ABC):
     def is_available(self) -> bool:
         """Check if backend is available"""
         pass
+    
+    def is_busy(self) -> bool:
+        """Whether a new request would queue behind running work"""
+        return False
 
 
 class WhisperBackend(VoiceRecognitionBackend):
     """OpenAI Whisper API backend - Most accurate"""
     
+    TRANSCRIPTIONS_URL = "https://api.openai.com/v1/audio/transcriptions"
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
         self.client = None
@@ -69,79 +179,342 @@ class WhisperBackend(VoiceRecognitionBackend):
     
     async def recognize(self, audio_data: bytes, language: str = "en-US") -> Optional[str]:
         """Recognize speech using Whisper API"""
-        if not self.client:
+        if not self.is_available():
             return None
         
+        # Map language codes (en-US -> en, nl-NL -> nl)
+        whisper_lang = language.split("-")[0]
+        
         try:
-            # Whisper expects a file, so write to temp file
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                temp_audio.write(audio_data)
-                temp_path = temp_audio.name
+            # Upload straight from memory over the shared, already-warm session
+            session = _session_var.get()
+            if session is not None:
+                return await self._recognize_http(session, audio_data, whisper_lang)
             
-            # Map language codes (en-US -> en, nl-NL -> nl)
-            whisper_lang = language.split("-")[0]
+            if not self.client:
+                return None
+            return await self._recognize_sdk(audio_data, whisper_lang)
             
-            # Transcribe using Whisper
+        except Exception as e:
+            logger.error("Whisper recognition error: %s", e)
+            return None
+    
+    async def _recognize_http(self, session, audio_data: bytes, language: str) -> Optional[str]:
+        """Post the audio to the transcription endpoint directly"""
+        form = aiohttp.FormData()
+        form.add_field("file", audio_data, filename="audio.wav", content_type="audio/wav")
+        form.add_field("model", "whisper-1")
+        form.add_field("language", language)
+        
+        async with session.post(
+            self.TRANSCRIPTIONS_URL,
+            data=form,
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        ) as response:
+            response.raise_for_status()
+            payload = await response.json()
+        return payload.get("text")
+    
+    async def _recognize_sdk(self, audio_data: bytes, language: str) -> Optional[str]:
+        """Transcribe through the OpenAI SDK (blocking upload in a thread)"""
+        # The SDK expects a file, so write to temp file
+        fd, temp_path = tempfile.mkstemp(suffix=".wav")
+        try:
+            os.write(fd, audio_data)
+        finally:
+            os.close(fd)
+        
+        try:
             with open(temp_path, "rb") as audio_file:
                 transcript = await asyncio.to_thread(
                     self.client.audio.transcriptions.create,
                     model="whisper-1",
                     file=audio_file,
-                    language=whisper_lang
+                    language=language
                 )
-            
-            # Clean up temp file
+        finally:
             Path(temp_path).unlink()
-            
-            return transcript.text
-            
-        except Exception as e:
-            logger.error(f"Whisper recognition error: {e}")
-            return None
+        
+        return transcript.text
     
     def is_available(self) -> bool:
-        return self.client is not None
+        return self.client is not None or bool(self.api_key and AIOHTTP_AVAILABLE)
+
+
+# CPU-bound Vosk decodes run in worker processes so concurrent requests
+# use separate cores instead of contending for the GIL
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+_CPU_POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+_cpu_pool_lock = threading.Lock()
+
+# Vosk models loaded inside a worker process, keyed by model path
+_worker_vosk_models: Dict[str, Any] = {}
+
+
+def _init_vosk_worker(model_path: str):
+    """Load the Vosk model once when a worker process starts"""
+    _worker_vosk_models[model_path] = Model(model_path)
+
+
+def _vosk_worker_ready() -> bool:
+    """No-op job used to start a worker (and load its model) ahead of time"""
+    return True
+
+
+def _decode_vosk_static(model_path: str, sample_rate: int, audio_frames: bytes) -> str:
+    """Decode PCM with Vosk inside a worker process"""
+    model = _worker_vosk_models.get(model_path)
+    if model is None:
+        model = _worker_vosk_models[model_path] = Model(model_path)
+    
+    # cffi only accepts bytes for the const char* argument (a no-op copy for bytes)
+    audio_frames = bytes(audio_frames)
+    rec = KaldiRecognizer(model, sample_rate)
+    segments = []
+    for i in range(0, len(audio_frames), VoskBackend.CHUNK_SIZE):
+        if rec.AcceptWaveform(audio_frames[i:i + VoskBackend.CHUNK_SIZE]):
+            text = _json.loads(rec.Result()).get("text", "")
+            if text:
+                segments.append(text)
+    
+    text = _json.loads(rec.FinalResult()).get("text", "")
+    if text:
+        segments.append(text)
+    return " ".join(segments)
+
+
+def _get_cpu_pool(model_path: str) -> ProcessPoolExecutor:
+    """Create the shared decode pool on first use"""
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            # By now the server, PortAudio and camera threads are running; a
+            # fork() could copy a lock one of them holds into the worker and
+            # deadlock it, so workers are forked from a forkserver instead.
+            # The forkserver preloads only this module, not __main__ (main.py
+            # skips building the assistant when re-imported as __mp_main__)
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([__name__])
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=_CPU_POOL_WORKERS,
+                mp_context=ctx,
+                initializer=_init_vosk_worker,
+                initargs=(model_path,)
+            )
+        return _cpu_pool
+
+
+def _shutdown_cpu_pool():
+    """Stop the shared decode pool's workers, dropping queued decodes (blocking)"""
+    global _cpu_pool
+    with _cpu_pool_lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 class VoskBackend(VoiceRecognitionBackend):
     """Vosk local speech recognition - Offline, fast"""
     
+    # Bytes fed to the recognizer per step (~125ms of 16kHz PCM16)
+    CHUNK_SIZE = 4000
+    
     def __init__(self, model_path: Optional[str] = None):
-        self.model = None
+        self.model = None  # In-process model, only loaded for interim streaming
         self.model_path = model_path or "/opt/vosk-models/vosk-model-small-en-us-0.15"
+        self._ready = False
         
-        if VOSK_AVAILABLE and Path(self.model_path).exists():
-            try:
-                self.model = Model(self.model_path)
-                logger.info(f"Vosk model loaded from {self.model_path}")
-            except Exception as e:
-                logger.error(f"Failed to load Vosk model: {e}")
+        # Called with partial text while audio is being decoded
+        self.on_interim_result: Optional[Callable] = None
+    
+    def _load_model(self):
+        """Load the in-process Vosk model used for interim results (blocking)"""
+        if self.model:
+            return
+        
+        try:
+            self.model = load_cached_model("vosk", self.model_path, lambda: Model(self.model_path))
+            logger.info("Vosk model loaded from %s", self.model_path)
+        except Exception as e:
+            logger.error("Failed to load Vosk model: %s", e)
+    
+    async def preload(self):
+        """Start the decode workers so the first request doesn't pay for it"""
+        if not VOSK_AVAILABLE or not Path(self.model_path).exists():
+            return
+        
+        try:
+            # With no idle worker, each submit starts one more process
+            pool = _get_cpu_pool(self.model_path)
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(pool, _vosk_worker_ready)
+                for _ in range(_CPU_POOL_WORKERS)
+            ))
+            self._ready = True
+            logger.info("Vosk workers loaded %s", self.model_path)
+        except Exception as e:
+            logger.error("Failed to start Vosk workers: %s", e)
     
     async def recognize(self, audio_data: bytes, language: str = "en-US") -> Optional[str]:
         """Recognize speech using Vosk"""
-        if not self.model:
+        if not self._ready:
             return None
         
         try:
             # Vosk expects 16kHz mono audio
-            # Parse WAV header to get parameters
-            audio_io = io.BytesIO(audio_data)
-            with wave.open(audio_io, 'rb') as wf:
-                sample_rate = wf.getframerate()
-                audio_frames = wf.readframes(wf.getnframes())
+            sample_rate, audio_frames = _parse_wav(audio_data)
             
-            # Create recognizer
-            rec = KaldiRecognizer(self.model, sample_rate)
-            rec.SetWords(True)
+            # Nothing to stream without an interim callback, so decode in a
+            # worker process instead of on the event loop
+            if not self.on_interim_result:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    _get_cpu_pool(self.model_path),
+                    _decode_vosk_static,
+                    self.model_path,
+                    sample_rate,
+                    bytes(audio_frames)
+                )
             
-            # Process audio
-            rec.AcceptWaveform(audio_frames)
-            result = json.loads(rec.FinalResult())
+            # Streaming partials needs a recognizer in this process
+            if not self.model:
+                await asyncio.to_thread(self._load_model)
+                if not self.model:
+                    return None
             
-            return result.get("text", "")
+            # Decode off the event loop; partials are handed back to it
+            callbacks = []
+            cancelled = threading.Event()
+            try:
+                text = await asyncio.to_thread(
+                    self._decode_streaming, sample_rate, audio_frames,
+                    self.on_interim_result, asyncio.get_running_loop(), callbacks, cancelled
+                )
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            
+            # Let every interim callback finish (and raise) before the final text
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in callbacks))
+            return text
             
         except Exception as e:
-            logger.error(f"Vosk recognition error: {e}")
+            logger.error("Vosk recognition error: %s", e)
+            return None
+    
+    def _decode_streaming(self, sample_rate: int, audio_frames, on_interim: Callable,
+                          loop: asyncio.AbstractEventLoop, callbacks: list,
+                          cancelled: threading.Event) -> str:
+        """Decode in-process, scheduling on_interim on the loop per partial (blocking)"""
+        rec = KaldiRecognizer(self.model, sample_rate)
+        rec.SetWords(True)
+        
+        # Feed audio in chunks so partial results are available early
+        segments = []
+        for i in range(0, len(audio_frames), self.CHUNK_SIZE):
+            if cancelled.is_set():
+                break
+            # cffi rejects memoryview slices; copy just this chunk to bytes
+            chunk = bytes(audio_frames[i:i + self.CHUNK_SIZE])
+            if rec.AcceptWaveform(chunk):
+                text = _json.loads(rec.Result()).get("text", "")
+                if text:
+                    segments.append(text)
+            else:
+                interim = _json.loads(rec.PartialResult()).get("partial", "")
+                if interim:
+                    callbacks.append(asyncio.run_coroutine_threadsafe(on_interim(interim), loop))
+        
+        text = _json.loads(rec.FinalResult()).get("text", "")
+        if text:
+            segments.append(text)
+        
+        return " ".join(segments)
+    
+    def is_available(self) -> bool:
+        return self._ready
+
+
+class FasterWhisperBackend(VoiceRecognitionBackend):
+    """Local Whisper via faster-whisper (CTranslate2 INT8) - Offline, accurate"""
+    
+    def __init__(self, model_size: str = "tiny"):
+        self.model = None
+        self.model_size = model_size
+        # Single worker: the model already uses all cores per decode
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faster-whisper")
+        self._inflight = 0  # Decodes submitted and not yet finished (incl. abandoned ones)
+        self._inflight_lock = threading.Lock()
+    
+    def _load_model(self):
+        """Load the Whisper model (blocking)"""
+        if self.model or not FASTER_WHISPER_AVAILABLE:
+            return
+        
+        try:
+            self.model = load_cached_model(
+                "faster_whisper",
+                self.model_size,
+                lambda: WhisperModel(self.model_size, device="cpu", compute_type="int8")
+            )
+            logger.info("faster-whisper model loaded: %s", self.model_size)
+        except Exception as e:
+            logger.error("Failed to load faster-whisper model: %s", e)
+    
+    async def preload(self):
+        """Load the model off the event loop"""
+        await asyncio.to_thread(self._load_model)
+    
+    def _transcribe(self, audio: "np.ndarray", language: str, cancelled: threading.Event) -> str:
+        """Run transcription; segments are decoded lazily so consume them here"""
+        segments, _ = self.model.transcribe(
+            audio,
+            language=language,
+            word_timestamps=False,
+            vad_filter=True
+        )
+        texts = []
+        for segment in segments:
+            # Abandoned (e.g. lost a race): stop decoding and free the worker
+            if cancelled.is_set():
+                break
+            texts.append(segment.text.strip())
+        return " ".join(texts)
+    
+    def _finished(self, _future):
+        with self._inflight_lock:
+            self._inflight -= 1
+    
+    def is_busy(self) -> bool:
+        return self._inflight > 0
+    
+    async def recognize(self, audio_data: bytes, language: str = "en-US") -> Optional[str]:
+        """Recognize speech using local faster-whisper"""
+        if not self.model:
+            return None
+        
+        try:
+            # Whisper expects 16kHz mono float32 in [-1, 1]
+            _, pcm = _parse_wav(audio_data)
+            audio = pcm16_to_float32(pcm)
+            
+            whisper_lang = language.split("-")[0]
+            
+            cancelled = threading.Event()
+            with self._inflight_lock:
+                self._inflight += 1
+            job = self._pool.submit(self._transcribe, audio, whisper_lang, cancelled)
+            job.add_done_callback(self._finished)
+            try:
+                return await asyncio.wrap_future(job)
+            except asyncio.CancelledError:
+                # Cancelling the asyncio side can't stop a running thread
+                cancelled.set()
+                raise
+            
+        except Exception as e:
+            logger.error("faster-whisper recognition error: %s", e)
             return None
     
     def is_available(self) -> bool:
@@ -179,10 +552,10 @@ class GoogleSpeechBackend(VoiceRecognitionBackend):
             logger.debug("Google Speech Recognition could not understand audio")
             return None
         except sr.RequestError as e:
-            logger.error(f"Google Speech Recognition error: {e}")
+            logger.error("Google Speech Recognition error: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Recognition error: {e}")
+            logger.error("Recognition error: %s", e)
             return None
     
     def is_available(self) -> bool:
@@ -206,15 +579,22 @@ class WebSpeechAPIBackend(VoiceRecognitionBackend):
         return False  # Not available on server side
 
 
+# Backends that run client-side; listed for clients but never dispatched
+BROWSER_BACKENDS: Dict[str, type] = {
+    "webspeech": WebSpeechAPIBackend,
+}
+
+
 class VoiceRecognitionService:
     """
     Reusable Voice Recognition Service
     
     Supports multiple backends with automatic fallback:
     1. Whisper (best accuracy, costs money)
-    2. Vosk (local, offline, fast)
-    3. Google (good balance, requires internet)
-    4. Web Speech API (browser-based)
+    2. faster-whisper (local Whisper, offline)
+    3. Vosk (local, offline, fast)
+    4. Google (good balance, requires internet)
+    5. Web Speech API (browser-based)
     
     Example usage:
         service = VoiceRecognitionService()
@@ -229,10 +609,41 @@ class VoiceRecognitionService:
         )
     """
     
+    # Streaming input format and VAD segmentation (20ms frames)
+    STREAM_SAMPLE_RATE = 16000
+    VAD_FRAME_BYTES = 640
+    VAD_SILENCE_FRAMES = 25   # 500ms of trailing silence ends an utterance
+    VAD_PREROLL_FRAMES = 10   # 200ms kept before speech onset
+    
+    # Offline backends, fastest first; raced against remote ones
+    LOCAL_BACKENDS = ("vosk", "faster_whisper")
+    
+    # Recent results kept for resubmitted audio
+    RESULT_CACHE_SIZE = 64
+    
     def __init__(self):
         self.backends: Dict[str, VoiceRecognitionBackend] = {}
+        
+        # Frozen dispatch tables built from self.backends in initialize()
+        self._backend_names: Tuple[str, ...] = ()
+        self._backend_instances: Tuple[VoiceRecognitionBackend, ...] = ()
+        self._backend_available: List[bool] = []
+        self._name_to_idx: Dict[str, int] = {}
         self.preferred_backend = "whisper"
-        self.fallback_order = ["whisper", "vosk", "google"]
+        self.fallback_order = ["whisper", "faster_whisper", "vosk", "google"]
+        self._ordered_backends: List[str] = list(self.fallback_order)
+        self._session = None
+        self.race_timeout = 10.0
+        
+        # Per-backend limits (seconds) so a hung call can't stall recognition
+        self._timeouts: Dict[str, float] = {
+            "whisper": 8.0,
+            "faster_whisper": 10.0,
+            "vosk": 5.0,
+            "google": 6.0,
+        }
+        self._result_cache: "OrderedDict[Tuple[bytes, str, Optional[str]], str]" = OrderedDict()
+        self._inflight: Dict[Tuple[bytes, str, Optional[str]], asyncio.Future] = {}
         
         # Callbacks for streaming recognition
         self.on_interim_result: Optional[Callable] = None
@@ -243,38 +654,76 @@ class VoiceRecognitionService:
         self,
         whisper_api_key: Optional[str] = None,
         vosk_model_path: Optional[str] = None,
-        preferred_backend: str = "whisper"
+        preferred_backend: str = "whisper",
+        faster_whisper_model: str = "tiny",
+        include_webspeech: bool = False
     ):
         """Initialize voice recognition service"""
         logger.info("Initializing Voice Recognition Service...")
         
+        # One pooled HTTP session for all backends, instead of one per call
+        if AIOHTTP_AVAILABLE and self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300)
+            )
+            _session_var.set(self._session)
+        
         # Initialize backends
         self.backends["whisper"] = WhisperBackend(whisper_api_key)
+        self.backends["faster_whisper"] = FasterWhisperBackend(faster_whisper_model)
         self.backends["vosk"] = VoskBackend(vosk_model_path)
         self.backends["google"] = GoogleSpeechBackend()
-        self.backends["webspeech"] = WebSpeechAPIBackend()
+        if include_webspeech:
+            self.backends["webspeech"] = WebSpeechAPIBackend()
+        
+        # Load local models now so the first request doesn't pay for it
+        await asyncio.gather(*(
+            backend.preload()
+            for backend in self.backends.values()
+            if hasattr(backend, "preload")
+        ))
+        
+        self._freeze_backends()
         
         # Set preferred backend
-        self.preferred_backend = preferred_backend
+        self.set_preferred_backend(preferred_backend)
         
         # Log available backends
-        available = [name for name, backend in self.backends.items() if backend.is_available()]
-        logger.info(f"Available backends: {available}")
+        available = self.get_available_backends()
+        logger.info("Available backends: %s", available)
         
         if not available:
             logger.warning("No voice recognition backends available!")
         
         return self
     
+    def set_preferred_backend(self, name: str):
+        """Set the preferred backend and recompute the try order"""
+        self.preferred_backend = name
+        self._ordered_backends = [name] + [
+            b for b in self.fallback_order if b != name
+        ]
+    
+    def _freeze_backends(self):
+        """Build index-based dispatch tables and cache availability"""
+        self._backend_names = tuple(self.backends)
+        self._backend_instances = tuple(self.backends.values())
+        self._backend_available = [b.is_available() for b in self._backend_instances]
+        self._name_to_idx = {name: i for i, name in enumerate(self._backend_names)}
+    
     def get_available_backends(self) -> List[str]:
         """Get list of available backends"""
-        return [name for name, backend in self.backends.items() if backend.is_available()]
+        return [
+            name for name, available in zip(self._backend_names, self._backend_available)
+            if available
+        ]
     
     async def recognize(
         self,
         audio_data: bytes,
         language: str = "en-US",
-        backend: Optional[str] = None
+        backend: Optional[str] = None,
+        race: bool = True
     ) -> Optional[str]:
         """
         Recognize speech from audio data
@@ -283,39 +732,148 @@ class VoiceRecognitionService:
             audio_data: Audio data in WAV format (bytes)
             language: Language code (e.g., "en-US", "nl-NL")
             backend: Specific backend to use (optional)
+            race: Run a remote preferred backend concurrently with the
+                fastest local one and take whichever answers first
         
         Returns:
             Recognized text or None
         """
+        # Request handlers run in their own context; bind the shared session
+        if self._session is not None:
+            _session_var.set(self._session)
+        
+        # Identical audio is answered from cache or shares an in-flight decode
+        key = (hashlib.blake2b(audio_data, digest_size=16).digest(), language, backend)
+        cached = self._result_cache.get(key)
+        if cached is not None:
+            self._result_cache.move_to_end(key)
+            return cached
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = None
+        try:
+            result = await self._recognize_uncached(audio_data, language, backend, race)
+        finally:
+            del self._inflight[key]
+            future.set_result(result)
+        
+        if result:
+            self._result_cache[key] = result
+            if len(self._result_cache) > self.RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+        return result
+    
+    async def _recognize_uncached(
+        self,
+        audio_data: bytes,
+        language: str,
+        backend: Optional[str],
+        race: bool
+    ) -> Optional[str]:
+        """Dispatch audio to the backends"""
         # Determine which backends to try
         backends_to_try = []
-        if backend and backend in self.backends:
+        if backend and backend in self._name_to_idx:
             backends_to_try = [backend]
         else:
-            # Try preferred backend first, then fallbacks
-            backends_to_try = [self.preferred_backend] + [
-                b for b in self.fallback_order if b != self.preferred_backend
-            ]
+            # Preferred backend first, then fallbacks
+            backends_to_try = self._ordered_backends
         
-        # Try each backend until one succeeds
-        for backend_name in backends_to_try:
-            backend_instance = self.backends.get(backend_name)
-            if not backend_instance or not backend_instance.is_available():
-                continue
-            
-            logger.info(f"Trying recognition with {backend_name}...")
-            try:
-                result = await backend_instance.recognize(audio_data, language)
+        name_to_idx = self._name_to_idx
+        available = self._backend_available
+        backends_to_try = [
+            name for name in backends_to_try
+            if name in name_to_idx and available[name_to_idx[name]]
+        ]
+        
+        # Race a remote backend against a local one so a slow network call
+        # doesn't delay the local fallback
+        if race and not backend and backends_to_try:
+            first = backends_to_try[0]
+            local = next(
+                (name for name in self.LOCAL_BACKENDS if name in backends_to_try),
+                None
+            )
+            # A busy local backend would only queue behind earlier decodes
+            if first not in self.LOCAL_BACKENDS and local and not self.backends[local].is_busy():
+                racers = [first, local]
+                result = await self._race_backends(racers, audio_data, language)
                 if result:
-                    logger.info(f"Recognition successful with {backend_name}: {result[:50]}...")
                     return result
-            except Exception as e:
-                logger.error(f"Backend {backend_name} failed: {e}")
-                continue
+                backends_to_try = [b for b in backends_to_try if b not in racers]
+        
+        # Try each backend until one succeeds
+        for backend_name in backends_to_try:
+            result = await self._try_backend(backend_name, audio_data, language)
+            if result:
+                return result
         
         logger.warning("All recognition backends failed")
         return None
     
+    async def _try_backend(
+        self,
+        backend_name: str,
+        audio_data: bytes,
+        language: str
+    ) -> Optional[str]:
+        """Run one backend, returning None on failure"""
+        idx = self._name_to_idx[backend_name]
+        backend_instance = self._backend_instances[idx]
+        
+        logger.info("Trying recognition with %s...", backend_name)
+        try:
+            result = await asyncio.wait_for(
+                backend_instance.recognize(audio_data, language),
+                timeout=self._timeouts.get(backend_name, 10.0)
+            )
+            if result:
+                logger.info("Recognition successful with %s: %.50s...", backend_name, result)
+            return result
+        except asyncio.TimeoutError:
+            logger.warning("Backend %s timed out", backend_name)
+            return None
+        except Exception as e:
+            logger.error("Backend %s failed: %s", backend_name, e)
+            # Only re-check availability when something actually broke
+            self._backend_available[idx] = backend_instance.is_available()
+            return None
+    
+    async def _race_backends(
+        self,
+        backend_names: List[str],
+        audio_data: bytes,
+        language: str
+    ) -> Optional[str]:
+        """Run backends concurrently and return the first non-empty result"""
+        pending = {
+            asyncio.create_task(self._try_backend(name, audio_data, language))
+            for name in backend_names
+        }
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.race_timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.warning("Recognition race timed out")
+                    break
+                for task in done:
+                    result = task.result()
+                    if result:
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+    
     async def recognize_from_file(
         self,
         file_path: str,
@@ -328,7 +886,7 @@ class VoiceRecognitionService:
                 audio_data = f.read()
             return await self.recognize(audio_data, language, backend)
         except Exception as e:
-            logger.error(f"Error reading audio file: {e}")
+            logger.error("Error reading audio file: %s", e)
             return None
     
     def set_callbacks(
@@ -341,6 +899,11 @@ class VoiceRecognitionService:
         self.on_interim_result = on_interim_result
         self.on_final_result = on_final_result
         self.on_error = on_error
+        
+        # Backends that decode incrementally report partials directly
+        for backend in self.backends.values():
+            if hasattr(backend, "on_interim_result"):
+                backend.on_interim_result = on_interim_result
     
     async def recognize_stream(
         self,
@@ -352,30 +915,99 @@ class VoiceRecognitionService:
         Recognize speech from audio stream
         
         Args:
-            audio_stream: Async generator yielding audio chunks
+            audio_stream: Async generator yielding raw 16kHz mono PCM16 chunks
             language: Language code
             backend: Specific backend to use
         """
-        # Accumulate audio chunks
-        audio_buffer = b""
+        if WEBRTCVAD_AVAILABLE:
+            await self._recognize_stream_vad(audio_stream, language, backend)
+            return
+        
+        # Without webrtcvad, fall back to fixed-size batches
+        audio_buffer = bytearray()
         
         async for chunk in audio_stream:
-            audio_buffer += chunk
+            audio_buffer.extend(chunk)
             
-            # Process when we have enough data
-            # This is a simple implementation - can be improved with VAD
-            if len(audio_buffer) >= 32000:  # ~2 seconds at 16kHz
-                result = await self.recognize(audio_buffer, language, backend)
+            if len(audio_buffer) >= 32000:  # ~1 second at 16kHz
+                await self._recognize_stream_segment(bytes(audio_buffer), language, backend)
+                audio_buffer.clear()
+    
+    async def _recognize_stream_vad(
+        self,
+        audio_stream,
+        language: str,
+        backend: Optional[str]
+    ):
+        """Segment the stream on trailing silence and recognize each utterance"""
+        # Vad keeps state across frames, so each stream gets its own
+        vad = webrtcvad.Vad(3)
+        frame_bytes = self.VAD_FRAME_BYTES
+        pending = bytearray()
+        preroll = deque(maxlen=self.VAD_PREROLL_FRAMES)
+        speech: List[bytes] = []
+        silent_frames = 0
+        
+        async for chunk in audio_stream:
+            pending.extend(chunk)
+            
+            while len(pending) >= frame_bytes:
+                frame = bytes(pending[:frame_bytes])
+                del pending[:frame_bytes]
+                is_speech = vad.is_speech(frame, self.STREAM_SAMPLE_RATE)
+                
+                if not speech:
+                    if is_speech:
+                        # Speech onset: keep the pre-roll so it isn't clipped
+                        speech.extend(preroll)
+                        preroll.clear()
+                        speech.append(frame)
+                        silent_frames = 0
+                    else:
+                        preroll.append(frame)
+                    continue
                 
-                if result and self.on_interim_result:
-                    await self.on_interim_result(result)
+                speech.append(frame)
+                silent_frames = 0 if is_speech else silent_frames + 1
                 
-                # Reset buffer (or keep last chunk for continuity)
-                audio_buffer = b""
+                if silent_frames >= self.VAD_SILENCE_FRAMES:
+                    await self._recognize_stream_segment(b"".join(speech), language, backend)
+                    speech.clear()
+                    silent_frames = 0
+        
+        # Flush whatever was still being spoken when the stream ended
+        if speech:
+            await self._recognize_stream_segment(b"".join(speech), language, backend)
+    
+    async def _recognize_stream_segment(
+        self,
+        pcm: bytes,
+        language: str,
+        backend: Optional[str]
+    ):
+        """Recognize one buffered stream segment and report the result"""
+        wav_data = _pcm16_to_wav(pcm, self.STREAM_SAMPLE_RATE)
+        result = await self.recognize(wav_data, language, backend)
+        
+        if result and self.on_interim_result:
+            await self.on_interim_result(result)
+    
+    async def aclose(self):
+        """Release the shared HTTP session and the decode worker processes"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await asyncio.to_thread(_shutdown_cpu_pool)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *_):
+        await self.aclose()
     
     def get_backend_info(self) -> Dict[str, Any]:
         """Get information about available backends"""
-        return {
+        info = {
             name: {
                 "available": backend.is_available(),
                 "type": type(backend).__name__,
@@ -383,15 +1015,23 @@ class VoiceRecognitionService:
             }
             for name, backend in self.backends.items()
         }
+        for name, backend_class in BROWSER_BACKENDS.items():
+            info.setdefault(name, {
+                "available": False,
+                "type": backend_class.__name__,
+                "description": backend_class.__doc__
+            })
+        return info
 
 
 # Convenience function
 async def create_voice_service(
     whisper_api_key: Optional[str] = None,
     vosk_model_path: Optional[str] = None,
-    preferred: str = "whisper"
+    preferred: str = "whisper",
+    faster_whisper_model: str = "tiny"
 ) -> VoiceRecognitionService:
     """Create and initialize voice recognition service"""
     service = VoiceRecognitionService()
-    await service.initialize(whisper_api_key, vosk_model_path, preferred)
+    await service.initialize(whisper_api_key, vosk_model_path, preferred, faster_whisper_model)
     return service
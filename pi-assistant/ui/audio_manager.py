@@ -3,26 +3,44 @@ Audio Manager for Pi Assistant
 Handles microphone input, speaker output, and speech recognition
 """
 
-# import asyncio
+import asyncio
 import logging
-# import numpy as np
-import io
+import base64
 import wave
 from typing import Optional
 import threading
+import queue
 # import time
 
-global AUDIO_AVAILABLE
-
 try:
     import pyaudio
     import speech_recognition as sr
     import pyttsx3
+    import numpy as np
     AUDIO_AVAILABLE = True
 except ImportError:
     AUDIO_AVAILABLE = False
+
+try:
+    import sounddevice as sd
+    SOUNDDEVICE_AVAILABLE = True
+except (ImportError, OSError):  # OSError: PortAudio library not found
+    SOUNDDEVICE_AVAILABLE = False
+
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+except ImportError:
+    VAD_AVAILABLE = False
+
+try:
+    from faster_whisper import WhisperModel
+    LOCAL_ASR_AVAILABLE = True
+except ImportError:
+    LOCAL_ASR_AVAILABLE = False
     
 from config import config
+from services.voice_recognition_service import load_cached_model, pcm16_to_float32
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +50,13 @@ class AudioManager:
     
     """Manages audio input/output and speech recognition"""
     
+    # Recording ring buffer holds the most recent RING_SECONDS of audio
+    RING_SECONDS = 30
+    
+    # VAD segmentation: 20ms frames, commit after 300ms of silence
+    VAD_FRAME_MS = 20
+    VAD_SILENCE_MS = 300
+    
     def __init__(self):
         self.is_recording = False
         self.recognizer = None
@@ -39,7 +64,33 @@ class AudioManager:
         self.tts_engine = None
         self.pyaudio_instance = None
         self.stream = None
-        self.audio_data = []
+        self._stream_is_sd = False  # stream is a sounddevice stream, not PyAudio
+        self.input_device_index = None  # PortAudio index matching AUDIO_INPUT_DEVICE
+        
+        # Recording state (see start_recording)
+        self._buf = None
+        self._view = None
+        self._ring = None
+        self._write_pos = 0
+        self._vad_pos = 0
+        self._speech_start = None
+        self._silent_frames = 0
+        self._vad = webrtcvad.Vad(2) if VAD_AVAILABLE else None
+        self._loop = None
+        self._segment_queue = None
+        self._segment_task = None
+        self._transcripts = []
+        
+        # On-device recognition model, loaded on first use
+        self._whisper_model = None
+        self._whisper_lock = threading.Lock()
+        
+        # Streamed chunks take turns on the model (see process_audio_chunk)
+        self._chunk_lock = asyncio.Lock()
+        
+        # pyttsx3 is not thread-safe; one long-lived worker owns the engine
+        self._tts_queue = queue.Queue()
+        self._tts_thread = None
         
         # Audio settings
         self.sample_rate = 16000
@@ -72,6 +123,7 @@ class AudioManager:
                 for i, name in enumerate(mic_list):
                     if config.AUDIO_INPUT_DEVICE.lower() in name.lower():
                         self.microphone = sr.Microphone(device_index=i)
+                        self.input_device_index = i
                         break
             
             if not self.microphone:
@@ -87,6 +139,9 @@ class AudioManager:
             self.tts_engine.setProperty('rate', 150)  # Speaking rate
             self.tts_engine.setProperty('volume', 0.8)
             
+            self._tts_thread = threading.Thread(target=self._tts_loop, daemon=True)
+            self._tts_thread.start()
+            
             # Adjust for ambient noise
             with self.microphone as source:
                 logger.info("Adjusting for ambient noise...")
@@ -96,34 +151,78 @@ class AudioManager:
             
         except Exception as e:
             logger.error(f"Audio initialization error: {e}")
-            AUDIO_AVAILABLE = False
+            self.audio_available = False
     
     async def start_recording(self):
-        if not AUDIO_AVAILABLE or not self.microphone:
+        if not self.audio_available or not self.microphone:
             raise Exception("Audio not available")
         
         if self.is_recording:
             return
         
         try:
+            # One preallocated buffer: callbacks copy raw bytes in through a
+            # memoryview, readers get a zero-copy int16 view of the same memory.
+            # Sample positions below are absolute; the ring index is pos % size
+            self._buf = bytearray(self.RING_SECONDS * self.sample_rate * 2)
+            self._view = memoryview(self._buf)
+            self._ring = np.frombuffer(self._buf, dtype=np.int16)
+            self._write_pos = 0
+            self._vad_pos = 0
+            self._speech_start = None
+            self._silent_frames = 0
+            self._transcripts = []
+            
+            self._loop = asyncio.get_running_loop()
+            self._segment_queue = asyncio.Queue()
+            
             self.is_recording = True
-            self.audio_data = []
-            
-            # Start audio stream
-            self.stream = self.pyaudio_instance.open(
-                format=self.format,
-                channels=self.channels,
-                rate=self.sample_rate,
-                input=True,
-                frames_per_buffer=self.chunk_size,
-                stream_callback=self._audio_callback
-            )
             
-            self.stream.start_stream()
+            # Start audio stream. sounddevice hands the callback a view of
+            # PortAudio's buffer; PyAudio allocates a new bytes object per chunk.
+            # Both take the PortAudio device index resolved in initialize()
+            if SOUNDDEVICE_AVAILABLE:
+                try:
+                    self.stream = sd.RawInputStream(
+                        samplerate=self.sample_rate,
+                        channels=self.channels,
+                        dtype='int16',
+                        blocksize=self.chunk_size,
+                        device=self.input_device_index,
+                        callback=self._sd_callback
+                    )
+                    self._stream_is_sd = True
+                    self.stream.start()
+                except Exception as e:
+                    logger.warning(f"sounddevice input failed, falling back to PyAudio: {e}")
+                    if self.stream:
+                        self.stream.close()
+                        self.stream = None
+            
+            if self.stream is None:
+                self._stream_is_sd = False
+                self.stream = self.pyaudio_instance.open(
+                    format=self.format,
+                    channels=self.channels,
+                    rate=self.sample_rate,
+                    input=True,
+                    input_device_index=self.input_device_index,
+                    frames_per_buffer=self.chunk_size,
+                    stream_callback=self._audio_callback
+                )
+                self.stream.start_stream()
+            
+            # Utterances are transcribed while recording continues. Started
+            # only once the stream is up, so a failed open leaves no task behind
+            self._segment_task = asyncio.create_task(self._recognize_segments())
+            
             logger.info("Started audio recording")
             
         except Exception as e:
             self.is_recording = False
+            if self.stream:
+                self.stream.close()
+                self.stream = None
             logger.error(f"Failed to start recording: {e}")
             raise e
     
@@ -136,34 +235,29 @@ class AudioManager:
             self.is_recording = False
             
             # Stop and close stream
-            self.stream.stop_stream()
+            if self._stream_is_sd:
+                self.stream.stop()
+            else:
+                self.stream.stop_stream()
             self.stream.close()
             self.stream = None
             
-            # Convert audio data to format for speech recognition
-            if self.audio_data:
-                audio_bytes = b''.join(self.audio_data)
-                
-                # Create WAV file in memory
-                wav_io = io.BytesIO()
-                with wave.open(wav_io, 'wb') as wav_file:
-                    wav_file.setnchannels(self.channels)
-                    wav_file.setsampwidth(self.pyaudio_instance.get_sample_size(self.format))
-                    wav_file.setframerate(self.sample_rate)
-                    wav_file.writeframes(audio_bytes)
-                
-                wav_io.seek(0)
-                
-                # Recognize speech
-                with sr.AudioFile(wav_io) as source:
-                    audio = self.recognizer.record(source)
-                
-                # Try different recognition methods
-                transcription = await self._recognize_speech(audio)
-                logger.info(f"Transcription: {transcription}")
-                return transcription
+            # Commit the utterance still in progress (everything without VAD)
+            if self._vad is None:
+                self._commit_segment(0, self._write_pos)
+            elif self._speech_start is not None:
+                self._commit_segment(self._speech_start, self._write_pos)
+            self._speech_start = None
             
-            return None
+            # The end marker takes the same call_soon_threadsafe path as the
+            # segments, so it is queued after every segment committed above
+            self._loop.call_soon_threadsafe(self._segment_queue.put_nowait, None)
+            await self._segment_task
+            self._segment_task = None
+            
+            transcription = " ".join(self._transcripts) or None
+            logger.info(f"Transcription: {transcription}")
+            return transcription
             
         except Exception as e:
             logger.error(f"Failed to stop recording: {e}")
@@ -172,12 +266,126 @@ class AudioManager:
     def _audio_callback(self, in_data, *_):
         """PyAudio callback for recording"""
         if self.is_recording:
-            self.audio_data.append(in_data)
+            self._ring_write(in_data)
+            if self._vad is not None:
+                self._run_vad()
         return (in_data, pyaudio.paContinue)
     
-    async def _recognize_speech(self, audio) -> Optional[str]:
-        """Recognize speech from audio data"""
+    def _sd_callback(self, indata, *_):
+        """sounddevice callback for recording"""
+        if self.is_recording:
+            self._ring_write(indata)
+            if self._vad is not None:
+                self._run_vad()
+    
+    def _ring_write(self, data: bytes):
+        """Copy PCM16 bytes into the ring buffer, wrapping at the end"""
+        size = len(self._buf)
+        n = len(data)
+        start = (self._write_pos * 2) % size
+        first = min(n, size - start)
+        self._view[start:start + first] = data[:first] if first < n else data
+        if first < n:
+            self._view[:n - first] = data[first:]
+        self._write_pos += n // 2
+    
+    def _ring_slice(self, start: int, end: int):
+        """Copy absolute sample range [start, end) out of the ring"""
+        size = len(self._ring)
+        start = max(start, end - size)  # older audio has been overwritten
+        lo, hi = start % size, end % size
+        if end - start == 0:
+            return self._ring[:0].copy()
+        if lo < hi:
+            return self._ring[lo:hi].copy()
+        return np.concatenate((self._ring[lo:], self._ring[:hi]))
+    
+    def _run_vad(self):
+        """Classify new frames and commit an utterance after trailing silence"""
+        frame_len = self.sample_rate * self.VAD_FRAME_MS // 1000
+        silence_limit = self.VAD_SILENCE_MS // self.VAD_FRAME_MS
+        
+        while self._write_pos - self._vad_pos >= frame_len:
+            # The ring length is a whole number of frames, so frames never wrap
+            lo = (self._vad_pos * 2) % len(self._buf)
+            frame = bytes(self._view[lo:lo + frame_len * 2])
+            is_speech = self._vad.is_speech(frame, self.sample_rate)
+            self._vad_pos += frame_len
+            
+            if is_speech:
+                if self._speech_start is None:
+                    self._speech_start = self._vad_pos - frame_len
+                self._silent_frames = 0
+            elif self._speech_start is not None:
+                self._silent_frames += 1
+                if self._silent_frames >= silence_limit:
+                    self._commit_segment(self._speech_start, self._vad_pos)
+                    self._speech_start = None
+                    self._silent_frames = 0
+    
+    def _commit_segment(self, start: int, end: int):
+        """Hand an utterance to the recognizer task (safe from any thread)"""
+        if end <= start:
+            return
+        segment = self._ring_slice(start, end)
+        self._loop.call_soon_threadsafe(self._segment_queue.put_nowait, segment)
+    
+    async def _recognize_segments(self):
+        """Transcribe committed utterances in order until stopped"""
+        while True:
+            segment = await self._segment_queue.get()
+            if segment is None:
+                break
+            text = await self._recognize_speech(segment)
+            if text:
+                self._transcripts.append(text)
+    
+    def _get_whisper_model(self):
+        """Load the faster-whisper model once (blocking)"""
+        if self._whisper_model is None:
+            with self._whisper_lock:
+                if self._whisper_model is None:
+                    # Shared with the voice service's faster-whisper backend
+                    self._whisper_model = load_cached_model(
+                        "faster_whisper",
+                        config.SPEECH_MODEL,
+                        lambda: WhisperModel(config.SPEECH_MODEL, device="cpu", compute_type="int8")
+                    )
+                    logger.info(f"Loaded faster-whisper model: {config.SPEECH_MODEL}")
+        return self._whisper_model
+    
+    def _transcribe_local(self, audio_bytes) -> Optional[str]:
+        """Transcribe 16kHz mono PCM16 on-device (blocking)"""
+        model = self._get_whisper_model()
+        audio = pcm16_to_float32(audio_bytes)
+        segments, _ = model.transcribe(
+            audio,
+            language=config.SPEECH_LANGUAGE,
+            beam_size=1,
+            without_timestamps=True
+        )
+        return " ".join(segment.text.strip() for segment in segments) or None
+    
+    async def _recognize_speech(self, audio_bytes) -> Optional[str]:
+        """Recognize speech from raw PCM16 audio (bytes or int16 array)"""
         try:
+            if LOCAL_ASR_AVAILABLE:
+                try:
+                    text = await asyncio.to_thread(self._transcribe_local, audio_bytes)
+                    if text or not config.SPEECH_CLOUD_FALLBACK:
+                        return text
+                except Exception as e:
+                    logger.warning(f"Local speech recognition failed: {e}")
+                    if not config.SPEECH_CLOUD_FALLBACK:
+                        return None
+            
+            # Fallback: hand the PCM straight to SpeechRecognition, no WAV round-trip
+            audio = sr.AudioData(
+                bytes(audio_bytes),
+                self.sample_rate,
+                self.pyaudio_instance.get_sample_size(self.format)
+            )
+            
             # Try Google Speech Recognition (requires internet)
             try:
                 text = self.recognizer.recognize_google(audio)
@@ -192,9 +400,6 @@ class AudioManager:
             except sr.RequestError:
                 logger.warning("Sphinx recognition unavailable")
             
-            # If we have OpenAI API, we could use Whisper API here
-            # This would require implementing Whisper API integration
-            
             return None
             
         except Exception as e:
@@ -202,31 +407,49 @@ class AudioManager:
             return None
     
     async def speak(self, text: str, blocking: bool = False):
-        if not AUDIO_AVAILABLE or not self.tts_engine:
+        if not self.audio_available or not self.tts_engine:
             logger.warning("TTS not available")
             return
         
         try:
             if blocking:
-                self.tts_engine.say(text)
-                self.tts_engine.runAndWait()
+                loop = asyncio.get_running_loop()
+                done = loop.create_future()
+                self._tts_queue.put((text, loop, done))
+                await done
             else:
-                # Run TTS in thread to avoid blocking
-                def speak_thread():
-                    self.tts_engine.say(text)
-                    self.tts_engine.runAndWait()
-                
-                thread = threading.Thread(target=speak_thread)
-                thread.daemon = True
-                thread.start()
+                self._tts_queue.put((text, None, None))
                 
         except Exception as e:
             logger.error(f"TTS error: {e}")
     
+    def _tts_loop(self):
+        """Speak queued utterances one at a time on the TTS worker thread"""
+        while True:
+            item = self._tts_queue.get()
+            if item is None:
+                break
+            
+            text, loop, done = item
+            try:
+                self.tts_engine.say(text)
+                self.tts_engine.runAndWait()
+            except Exception as e:
+                logger.error(f"TTS error: {e}")
+            finally:
+                if done is not None:
+                    loop.call_soon_threadsafe(self._resolve_tts_future, done)
+    
+    @staticmethod
+    def _resolve_tts_future(done: asyncio.Future):
+        """Wake a blocking speak() caller (cleanup may have cancelled it already)"""
+        if not done.done():
+            done.set_result(None)
+    
     async def play_audio_file(self, file_path: str):
         """Play an audio file"""
         try:
-            if not AUDIO_AVAILABLE:
+            if not self.audio_available:
                 # Fallback to system audio player
                 import subprocess
                 subprocess.run(['aplay', file_path], check=True)
@@ -256,16 +479,26 @@ class AudioManager:
         except Exception as e:
             logger.error(f"Audio playback error: {e}")
     
-    async def process_audio_chunk(self, _: bytes) -> Optional[str]:
-        """Process a chunk of audio data for real-time recognition"""
-        # This would be used for WebSocket streaming audio
-        # Implementation depends on the specific use case
-        # Could accumulate chunks and process when silence is detected
-        return None
+    async def process_audio_chunk(self, audio_data) -> Optional[str]:
+        """Recognize a PCM16 utterance streamed over WebSocket"""
+        if not audio_data or not LOCAL_ASR_AVAILABLE:
+            return None
+        
+        if isinstance(audio_data, str):
+            audio_data = base64.b64decode(audio_data)
+        
+        # The decoder is serial, so concurrent clients queue on the lock
+        # instead of piling decodes onto worker threads
+        async with self._chunk_lock:
+            try:
+                return await asyncio.to_thread(self._transcribe_local, audio_data)
+            except Exception as e:
+                logger.warning(f"Local speech recognition failed: {e}")
+                return None
     
     def get_audio_devices(self) -> dict:
         """Get list of available audio devices"""
-        if not AUDIO_AVAILABLE or not self.pyaudio_instance:
+        if not self.audio_available or not self.pyaudio_instance:
             return {"input": [], "output": []}
         
         try:
@@ -302,12 +535,23 @@ class AudioManager:
                 await self.stop_recording()
             
             if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
+                self.stream.close()  # PyAudio and sounddevice both stop on close
             
             if self.pyaudio_instance:
                 self.pyaudio_instance.terminate()
             
+            if self._tts_thread:
+                # Drop pending utterances so shutdown isn't delayed, waking any
+                # blocking speak() callers waiting on them
+                with self._tts_queue.mutex:
+                    pending = list(self._tts_queue.queue)
+                    self._tts_queue.queue.clear()
+                for item in pending:
+                    if item is not None and item[2] is not None:
+                        _, loop, done = item
+                        loop.call_soon_threadsafe(done.cancel)
+                self._tts_queue.put(None)
+            
             if self.tts_engine:
                 self.tts_engine.stop()
             
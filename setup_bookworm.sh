@@ -20,6 +20,24 @@ warn() { echo -e "${YELLOW}[!]${NC} $*"; }
 error() { echo -e "${RED}[✗]${NC} $*"; exit 1; }
 step() { echo -e "\n${MAGENTA}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}"; echo -e "${CYAN}STEP $1${NC}"; echo -e "${MAGENTA}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━${NC}\n"; }
 
+# Package installs: apt-fast (parallel aria2 downloads) when it's installed,
+# plain apt-get otherwise. apt-fast isn't packaged for Debian, so it is
+# used opportunistically rather than bootstrapped
+apt_install() {
+    if command -v apt-fast &>/dev/null; then
+        sudo $(eatmydata_prefix) apt-fast install -y "$@"
+    else
+        sudo $(eatmydata_prefix) apt-get install -y "$@"
+    fi
+}
+
+# dpkg fsyncs every file it unpacks, which dominates install time on SD
+# cards. eatmydata turns those fsyncs into no-ops; a fresh setup can simply
+# be re-run if power is lost mid-install
+eatmydata_prefix() {
+    command -v eatmydata &>/dev/null && echo eatmydata || true
+}
+
 # Variables
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_DIR="$SCRIPT_DIR/pi-assistant"
@@ -33,6 +51,7 @@ NON_INTERACTIVE=${NON_INTERACTIVE:-false}
 SKIP_PI_CHECK=${SKIP_PI_CHECK:-false}
 INSTALL_OLLAMA=${INSTALL_OLLAMA:-true}
 ENABLE_SYSTEMD=${ENABLE_SYSTEMD:-false}
+FULL_UPGRADE=${FULL_UPGRADE:-false}
 
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
@@ -53,6 +72,10 @@ while [[ $# -gt 0 ]]; do
             INSTALL_OLLAMA=false
             shift
             ;;
+        --full-upgrade)
+            FULL_UPGRADE=true
+            shift
+            ;;
         --help|-h)
             echo "Usage: $0 [OPTIONS]"
             echo ""
@@ -64,6 +87,7 @@ while [[ $# -gt 0 ]]; do
             echo "  --skip-pi-check          Skip Raspberry Pi hardware check"
             echo "  --enable-systemd         Enable systemd services automatically"
             echo "  --skip-ollama            Skip Ollama installation"
+            echo "  --full-upgrade           Also upgrade all installed packages"
             echo "  -h, --help               Show this help message"
             echo ""
             echo "Environment variables:"
@@ -71,6 +95,7 @@ while [[ $# -gt 0 ]]; do
             echo "  SKIP_PI_CHECK=true       Same as --skip-pi-check"
             echo "  ENABLE_SYSTEMD=true      Same as --enable-systemd"
             echo "  INSTALL_OLLAMA=false     Same as --skip-ollama"
+            echo "  FULL_UPGRADE=true        Same as --full-upgrade"
             exit 0
             ;;
         *)
@@ -135,7 +160,15 @@ check_raspberry_pi() {
     
     log "Checking Raspberry Pi hardware..."
     
-    if [[ ! -f /proc/cpuinfo ]] || ! grep -q "Raspberry Pi" /proc/cpuinfo 2>/dev/null; then
+    # Read the board model once (device tree first, cpuinfo's Model line otherwise)
+    local model=""
+    if [[ -r /proc/device-tree/model ]]; then
+        model=$(tr -d '\0' < /proc/device-tree/model)
+    elif [[ -r /proc/cpuinfo ]]; then
+        model=$(grep -m1 "^Model" /proc/cpuinfo || true)
+    fi
+    
+    if [[ "$model" != *"Raspberry Pi"* ]]; then
         warn "Not running on Raspberry Pi detected."
         warn "Some hardware features (camera, GPIO, Hailo) may not work."
         if [[ "$NON_INTERACTIVE" == "false" ]]; then
@@ -145,7 +178,7 @@ check_raspberry_pi() {
         fi
     else
         # Check for Pi 5
-        if grep -q "Raspberry Pi 5" /proc/cpuinfo 2>/dev/null; then
+        if [[ "$model" == *"Raspberry Pi 5"* ]]; then
             success "Raspberry Pi 5 detected ✓"
         else
             warn "Not running on Raspberry Pi 5"
@@ -164,8 +197,16 @@ update_system() {
     log "Updating package lists..."
     sudo apt update
     
-    log "Upgrading installed packages (this may take a while)..."
-    sudo apt upgrade -y
+    # Installed first so the upgrade and all later installs skip fsync
+    sudo apt-get install -y eatmydata || warn "eatmydata not available; installs will be slower"
+    
+    # Upgrading everything can pull hundreds of MB unrelated to this project
+    if [[ "$FULL_UPGRADE" == "true" ]]; then
+        log "Upgrading installed packages (this may take a while)..."
+        sudo $(eatmydata_prefix) apt-get upgrade -y
+    else
+        log "Skipping full upgrade (use --full-upgrade to upgrade all packages)"
+    fi
     
     success "System updated successfully"
 }
@@ -178,7 +219,7 @@ install_base_dependencies() {
     ((step_num++))
     
     log "Installing Python and build tools..."
-    sudo apt install -y \
+    apt_install \
         python3-full \
         python3-pip \
         python3-venv \
@@ -193,7 +234,7 @@ install_base_dependencies() {
         net-tools
     
     log "Installing audio libraries..."
-    sudo apt install -y \
+    apt_install \
         libasound2-dev \
         portaudio19-dev \
         libportaudio2 \
@@ -204,7 +245,7 @@ install_base_dependencies() {
         ffmpeg
     
     log "Installing video/camera libraries..."
-    sudo apt install -y \
+    apt_install \
         v4l-utils \
         libv4l-dev \
         i2c-tools
@@ -220,7 +261,7 @@ install_pi_hardware() {
     ((step_num++))
     
     log "Installing camera support..."
-    sudo apt install -y \
+    apt_install \
         raspberrypi-kernel-headers \
         libcamera-apps \
         libcamera-dev \
@@ -228,14 +269,14 @@ install_pi_hardware() {
         python3-picamera2
     
     log "Installing system Python libraries (recommended for stability)..."
-    sudo apt install -y \
+    apt_install \
         python3-opencv \
         python3-numpy \
         python3-pil \
         python3-scipy || warn "Some Python libraries not available"
     
     # Try to install PyAudio from system
-    sudo apt install -y python3-pyaudio || warn "PyAudio not available from apt"
+    apt_install python3-pyaudio || warn "PyAudio not available from apt"
     
     success "System Python packages installed"
     
@@ -263,12 +304,13 @@ install_hailo_support() {
     
     log "Checking for Hailo device..."
     
-    # Check if Hailo device is present
-    if lspci | grep -i hailo &>/dev/null; then
+    # Check if Hailo device is present (PCI vendor 0x1e60, read straight from
+    # sysfs - lspci isn't always installed and needs no pipeline here)
+    if grep -qsx "0x1e60" /sys/bus/pci/devices/*/vendor; then
         success "Hailo device detected!"
         
         # Check for Hailo driver
-        if lsmod | grep -q hailo; then
+        if [ -d /sys/module/hailo_pci ]; then
             success "Hailo kernel module loaded"
         else
             warn "Hailo kernel module not loaded"